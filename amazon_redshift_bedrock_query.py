@@ -1,57 +1,149 @@
 import os
-import json
+import re
+import orjson
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import boto3
-from sqlalchemy import create_engine, text
+from botocore.config import Config
+from sqlalchemy import text
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
+from semantic_cache import SemanticCache
+from redshift_db import get_engine
 
 # Loading environment variables
 load_dotenv()
 
-def call_bedrock_directly(prompt, model_id="amazon.titan-text-express-v1"):
+# Fenced code block (optionally tagged sql) and lines that look like SQL
+_SQL_FENCE = re.compile(r'```(?:sql)?\s*(.*?)```', re.S | re.I)
+_SQL_KEYWORD = re.compile(r'\b(?:SELECT|FROM|WHERE)\b', re.I)
+# A statement ends at the first ';' after SELECT/WITH that is outside quotes
+_SQL_STATEMENT_END = re.compile(r'''\b(?:SELECT|WITH)\b(?:[^'";]|'[^']*'|"[^"]*")*;''', re.I)
+
+# Shared Bedrock client, built once so credential resolution and TLS setup
+# are not repeated on every question
+_BEDROCK = boto3.client(
+    'bedrock-runtime',
+    region_name='us-east-1',
+    config=Config(max_pool_connections=32, retries={'max_attempts': 2})
+)
+
+# Any Titan text model works here, e.g. amazon.titan-text-lite-v1 for lower latency
+BEDROCK_MODEL_ID = os.getenv('BEDROCK_MODEL_ID') or "amazon.titan-text-express-v1"
+
+# Generated SQL for this schema is well under 100 tokens
+SQL_MAX_TOKENS = 128
+
+def titan_request_body(prompt, max_tokens=500):
+    """Build the Titan text generation request body"""
+    return {
+        "inputText": prompt,
+        "textGenerationConfig": {
+            "maxTokenCount": max_tokens,
+            "temperature": 0.1,
+            "topP": 0.9
+        }
+    }
+
+def call_bedrock_directly(prompt, model_id=BEDROCK_MODEL_ID, max_tokens=500):
     """Call AWS Bedrock directly without LangChain"""
     try:
-        bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1')
+        response = _BEDROCK.invoke_model(
+            modelId=model_id,
+            body=orjson.dumps(titan_request_body(prompt, max_tokens=max_tokens)),
+            contentType="application/json",
+            accept="application/json"
+        )
         
-        body = {
-            "inputText": prompt,
-            "textGenerationConfig": {
-                "maxTokenCount": 500,
-                "temperature": 0.1,
-                "topP": 0.9
-            }
-        }
+        response_body = orjson.loads(response['body'].read())
+        return response_body['results'][0]['outputText'].strip()
         
-        response = bedrock_runtime.invoke_model(
+    except Exception as e:
+        print(f"Bedrock error: {e}")
+        return None
+
+def sql_statement_complete(output):
+    """Whether streamed output already holds a full SQL statement"""
+    if '```' in output:
+        return _SQL_FENCE.search(output) is not None
+    return _SQL_STATEMENT_END.search(output) is not None
+
+# Cleared the first time streaming is denied, so later questions go straight to InvokeModel
+_STREAMING_ALLOWED = True
+
+def stream_bedrock_sql(prompt, model_id=BEDROCK_MODEL_ID):
+    """Stream a Titan completion and stop reading once the SQL statement is complete"""
+    global _STREAMING_ALLOWED
+    if not _STREAMING_ALLOWED:
+        return call_bedrock_directly(prompt, model_id, max_tokens=SQL_MAX_TOKENS)
+    try:
+        response = _BEDROCK.invoke_model_with_response_stream(
             modelId=model_id,
-            body=json.dumps(body),
+            body=orjson.dumps(titan_request_body(prompt, max_tokens=SQL_MAX_TOKENS)),
             contentType="application/json",
             accept="application/json"
         )
         
-        response_body = json.loads(response['body'].read())
-        return response_body['results'][0]['outputText'].strip()
+        stream = response['body']
+        output = ""
+        try:
+            for event in stream:
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                output += orjson.loads(chunk['bytes'])['outputText']
+                if sql_statement_complete(output):
+                    break
+        finally:
+            stream.close()
         
+        return output.strip()
+        
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'AccessDeniedException':
+            print(f"Bedrock error: {e}")
+            return None
+        # Streaming needs bedrock:InvokeModelWithResponseStream; fall back to a buffered call
+        print("Bedrock streaming denied, falling back to InvokeModel")
+        _STREAMING_ALLOWED = False
+        return call_bedrock_directly(prompt, model_id, max_tokens=SQL_MAX_TOKENS)
     except Exception as e:
         print(f"Bedrock error: {e}")
         return None
 
-def get_redshift_connection():
-    """Create Redshift connection"""
-    REDSHIFT_HOST = os.getenv('REDSHIFT_HOST')
-    REDSHIFT_PORT = os.getenv('REDSHIFT_PORT') or '5439'
-    REDSHIFT_DATABASE = os.getenv('REDSHIFT_DB')
-    REDSHIFT_USERNAME = os.getenv('REDSHIFT_USER')
-    REDSHIFT_PASSWORD = os.getenv('REDSHIFT_PASSWORD')
+# Titan v2 accepts 256, 512 or 1024; the full 1024 gives the most precise
+# similarity scores for deciding whether cached SQL is reused
+EMBEDDING_DIMENSIONS = int(os.getenv('BEDROCK_EMBEDDING_DIMENSIONS') or 1024)
 
-    if not REDSHIFT_PORT or REDSHIFT_PORT.lower() == 'none':
-        REDSHIFT_PORT = '5439'
+def embed_text(text, model_id="amazon.titan-embed-text-v2:0"):
+    """Return a normalized Titan embedding for text"""
+    body = {
+        "inputText": text,
+        "dimensions": EMBEDDING_DIMENSIONS,
+        "normalize": True
+    }
+    response = _BEDROCK.invoke_model(
+        modelId=model_id,
+        body=orjson.dumps(body),
+        contentType="application/json",
+        accept="application/json"
+    )
+    return orjson.loads(response['body'].read())['embedding']
 
-    if not all([REDSHIFT_HOST, REDSHIFT_DATABASE, REDSHIFT_USERNAME, REDSHIFT_PASSWORD]):
-        raise ValueError("Missing required Redshift environment variables")
+# SQL generated for previously seen questions; the SQL is re-run on a hit so
+# answers always reflect the current table contents. Only exact (normalized)
+# matches are reused unless SEMANTIC_CACHE_THRESHOLD opts in to similarity search.
+SEMANTIC_CACHE_THRESHOLD = (os.getenv('SEMANTIC_CACHE_THRESHOLD') or 'off').strip().lower()
+_SQL_CACHE = SemanticCache(
+    None if SEMANTIC_CACHE_THRESHOLD == 'off' else embed_text,
+    threshold=1.0 if SEMANTIC_CACHE_THRESHOLD == 'off' else float(SEMANTIC_CACHE_THRESHOLD),
+    ttl_seconds=int(os.getenv('SEMANTIC_CACHE_TTL') or 3600)
+)
 
-    connection_string = f"redshift+psycopg2://{REDSHIFT_USERNAME}:{REDSHIFT_PASSWORD}@{REDSHIFT_HOST}:{REDSHIFT_PORT}/{REDSHIFT_DATABASE}"
-    return create_engine(connection_string, isolation_level="AUTOCOMMIT")
+@functools.lru_cache(maxsize=1)
+def get_query_engine():
+    """Shared Redshift engine in autocommit mode; this module only reads"""
+    return get_engine().execution_options(isolation_level="AUTOCOMMIT")
 
 def get_table_schema():
     """Return database schema for prompt"""
@@ -62,8 +154,8 @@ CREATE TABLE artists (
     full_name VARCHAR(200),
     nationality VARCHAR(50), 
     gender VARCHAR(25),
-    birth_year INTEGER,
-    death_year INTEGER,
+    birth_year SMALLINT,
+    death_year SMALLINT,
     CONSTRAINT artists_pk PRIMARY KEY (artist_id)
 )
 
@@ -85,21 +177,12 @@ def extract_sql_from_response(response):
         return None
     
     # Look for SQL in code blocks
-    if "```sql" in response:
-        start = response.find("```sql") + 6
-        end = response.find("```", start)
-        return response[start:end].strip()
-    elif "```" in response:
-        start = response.find("```") + 3
-        end = response.find("```", start)
-        return response[start:end].strip()
+    fenced = _SQL_FENCE.search(response)
+    if fenced:
+        return fenced.group(1).strip()
     
     # Look for SELECT statements
-    lines = response.split('\n')
-    sql_lines = []
-    for line in lines:
-        if any(keyword in line.upper() for keyword in ['SELECT', 'FROM', 'WHERE']):
-            sql_lines.append(line.strip())
+    sql_lines = [line.strip() for line in response.split('\n') if _SQL_KEYWORD.search(line)]
     
     return '\n'.join(sql_lines) if sql_lines else response.strip()
 
@@ -136,19 +219,23 @@ def simple_nl_to_sql(question):
     else:
         return "SELECT COUNT(*) FROM artists;"
 
-def natural_language_to_sql(question):
-    """Convert natural language to SQL using Bedrock LLM only"""
-    schema = get_table_schema()
-    prompt = f"""Convert this natural language question to SQL using the schema below.
+@functools.lru_cache(maxsize=1)
+def get_prompt_prefix():
+    """Build the static part of the SQL prompt once"""
+    return f"""Convert this natural language question to SQL using the schema below.
 Return ONLY the SQL query, no explanations.
 
-{schema}
+{get_table_schema()}
+"""
 
+def natural_language_to_sql(question):
+    """Convert natural language to SQL using Bedrock LLM only"""
+    prompt = f"""{get_prompt_prefix()}
 Question: {question}
 
 SQL:"""
     
-    response = call_bedrock_directly(prompt)
+    response = stream_bedrock_sql(prompt)
     if not response:
         raise Exception("Bedrock LLM failed to respond")
     
@@ -161,7 +248,7 @@ SQL:"""
 def execute_sql_query(sql_query):
     """Execute SQL and format results"""
     try:
-        engine = get_redshift_connection()
+        engine = get_query_engine()
         with engine.connect() as conn:
             result = conn.execute(text(sql_query))
             rows = result.fetchall()
@@ -173,18 +260,20 @@ def execute_sql_query(sql_query):
             if len(rows) == 1 and len(rows[0]) == 1:
                 return f"{rows[0][0]:,}"
             
-            # Multiple rows - format as table
-            formatted_result = []
-            
-            # Add rows (limit to 20)
-            for i, row in enumerate(rows[:20]):
-                row_str = " | ".join(f"{str(val):15}" for val in row)
-                formatted_result.append(row_str)
+            # Multiple rows - format as table (limit to 20)
+            lines = [[str(value) for value in line] for line in [result.keys(), *rows[:20]]]
+            widths = [max(len(line[i]) for line in lines) for i in range(len(lines[0]))]
+            # ' | ' keeps cells apart when the app renders the answer as markdown,
+            # which collapses the padding
+            formatted_result = "\n".join(
+                " | ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip()
+                for line in lines
+            )
             
             if len(rows) > 20:
-                formatted_result.append(f"... and {len(rows) - 20} more rows")
+                formatted_result += f"\n... and {len(rows) - 20} more rows"
             
-            return "\n".join(formatted_result)
+            return formatted_result
             
     except Exception as e:
         return f"Error executing query: {str(e)}"
@@ -193,9 +282,14 @@ def redshift_answer(question):
     """Main function - returns (sql, answer) tuple"""
     try:
         print(f"Processing: {question}")
+
+        # Reuse the SQL generated for an identical or near-identical question
+        cached_sql, question_vector = _SQL_CACHE.lookup(question)
+        if cached_sql:
+            print("Semantic cache hit")
         
         # Convert to SQL
-        sql_query = natural_language_to_sql(question)
+        sql_query = cached_sql or natural_language_to_sql(question)
         
         if not sql_query:
             return ("-- Unable to generate SQL", "Sorry, I couldn't understand your question.")
@@ -204,6 +298,11 @@ def redshift_answer(question):
         
         # Execute SQL
         answer = execute_sql_query(sql_query)
+
+        # Only freshly generated SQL is stored: re-adding a hit would refresh its TTL
+        # and make the new question another match point for the old SQL
+        if not cached_sql and not answer.startswith("Error executing query"):
+            _SQL_CACHE.add(question, question_vector, sql_query)
         
         return (sql_query, answer)
         
@@ -211,19 +310,27 @@ def redshift_answer(question):
         error_msg = f"Sorry, I encountered an error: {str(e)}"
         return ("-- Error occurred", error_msg)
 
+def probe_bedrock():
+    """Send a trivial prompt to Bedrock through the streaming path questions use"""
+    response = stream_bedrock_sql("Hello, can you help me?")
+    return f"✓ Bedrock test: {response[:50] if response else 'Failed'}"
+
+def probe_redshift():
+    """Count the artists in Redshift"""
+    engine = get_query_engine()
+    with engine.connect() as conn:
+        result = conn.execute(text("SELECT COUNT(*) FROM artists"))
+        count = result.fetchone()[0]
+    return f"✓ Redshift test: {count} artists found"
+
 def test_connection():
     """Test the setup"""
     try:
-        # Test Bedrock
-        response = call_bedrock_directly("Hello, can you help me?")
-        print(f"✓ Bedrock test: {response[:50] if response else 'Failed'}")
-        
-        # Test Redshift
-        engine = get_redshift_connection()
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT COUNT(*) FROM artists"))
-            count = result.fetchone()[0]
-            print(f"✓ Redshift test: {count} artists found")
+        # Bedrock and Redshift probes are independent, so wait on both at once
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            probes = [executor.submit(probe_bedrock), executor.submit(probe_redshift)]
+            for probe in probes:
+                print(probe.result())
         
         # Test full flow
         sql, answer = redshift_answer("How many artists are there?")
@@ -1,5 +1,5 @@
 import boto3
-import json
+import orjson
 from botocore.exceptions import ClientError
 
 def test_bedrock_inference():
@@ -11,7 +11,7 @@ def test_bedrock_inference():
         prompt = "Explain AWS Bedrock in one sentence"
         
         # Titan text model request
-        body = json.dumps({
+        body = orjson.dumps({
             "inputText": prompt,
             "textGenerationConfig": {
                 "maxTokenCount": 100,
@@ -24,16 +24,29 @@ def test_bedrock_inference():
             body=body
         )
         
-        result = json.loads(response['body'].read())
+        result = orjson.loads(response['body'].read())
         print("Inference successful!")
         print(f"Response: {result['results'][0]['outputText']}")
+        
+        # SQL generation streams its response, which is a separate IAM action
+        stream = bedrock.invoke_model_with_response_stream(
+            modelId="amazon.titan-text-express-v1",
+            body=body
+        )['body']
+        try:
+            for event in stream:
+                if 'chunk' in event:
+                    break
+        finally:
+            stream.close()
+        print("Streaming inference successful!")
         return True
         
     except ClientError as e:
         print(f"Inference error: {e}")
         if e.response['Error']['Code'] == 'AccessDeniedException':
             print("\nPossible IAM permission issue. Ensure your IAM role has:")
-            print("- bedrock:InvokeModel permission")
+            print("- bedrock:InvokeModel and bedrock:InvokeModelWithResponseStream permissions")
             print("- Or AmazonBedrockFullAccess policy attached")
         return False
 
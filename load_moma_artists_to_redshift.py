@@ -1,86 +1,78 @@
 import csv
+import gzip
+import io
+import mmap
+import multiprocessing
 import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
-load_dotenv()
-
-def get_redshift_connection():
-    """Create and return a Redshift connection with autocommit"""
-    REDSHIFT_HOST = os.getenv('REDSHIFT_HOST')
-    REDSHIFT_PORT = os.getenv('REDSHIFT_PORT', '5439')
-    REDSHIFT_DB = os.getenv('REDSHIFT_DB')
-    REDSHIFT_USER = os.getenv('REDSHIFT_USER')
-    REDSHIFT_PASSWORD = os.getenv('REDSHIFT_PASSWORD')
-    
-    # Create engine with autocommit isolation level
-    engine = create_engine(
-        f"redshift+psycopg2://{REDSHIFT_USER}:{REDSHIFT_PASSWORD}@{REDSHIFT_HOST}:{REDSHIFT_PORT}/{REDSHIFT_DB}",
-        isolation_level="AUTOCOMMIT"
-    )
-    return engine
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import boto3
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+from redshift_db import REDSHIFT_CONFIG, get_engine
 
 def check_redshift_connection(engine):
     """Verify Redshift connection works"""
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        # Checking out a pooled connection is enough: pool_pre_ping tests reused
+        # connections and a new one has just completed its handshake
+        engine.connect().close()
         return True
     except Exception as e:
         print(f"Redshift connection error: {str(e)}")
         return False
 
-def inspect_csv_structure(csv_path):
-    """Inspect CSV file structure and return column mappings"""
-    if not os.path.exists(csv_path):
-        print(f"Error: CSV file not found at {csv_path}")
-        return None
-    
-    with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig automatically handles BOM
-        reader = csv.DictReader(f)
-        headers = reader.fieldnames
-        
-        print(f"CSV headers found: {headers}")
-        
-        # Try to read first row to see sample data
-        try:
-            first_row = next(reader)
-            print(f"Sample row: {dict(list(first_row.items())[:5])}...")  # Show first 5 fields
-        except StopIteration:
-            print("CSV file appears to be empty")
-            return None
-    
-    # Create column mapping based on common variations
+# Normalized CSV header -> artist column, covering common variations
+HEADER_ALIASES = {
+    alias: column
+    for column, aliases in {
+        'artist_id': ['artist_id', 'artistid', 'id', 'constituentid'],
+        'full_name': ['full_name', 'name', 'artist_name', 'display_name', 'displayname'],
+        'nationality': ['nationality', 'nation'],
+        'gender': ['gender', 'sex'],
+        'birth_year': ['birth_year', 'birthyear', 'birth', 'born', 'beginyear'],
+        'death_year': ['death_year', 'deathyear', 'death', 'died', 'endyear'],
+    }.items()
+    for alias in aliases
+}
+
+def detect_column_mapping(headers):
+    """Map artist columns to the matching CSV headers"""
     column_mapping = {}
     
     for header in headers:
-        # Remove BOM and clean header
-        header_clean = header.replace('\ufeff', '').lower().strip()
-        
-        # Map various possible column names to our schema
-        if header_clean in ['artist_id', 'artistid', 'id', 'constituentid']:
-            column_mapping['artist_id'] = header
-        elif header_clean in ['full_name', 'name', 'artist_name', 'display_name', 'displayname']:
-            column_mapping['full_name'] = header
-        elif header_clean in ['nationality', 'nation']:
-            column_mapping['nationality'] = header
-        elif header_clean in ['gender', 'sex']:
-            column_mapping['gender'] = header
-        elif header_clean in ['birth_year', 'birthyear', 'birth', 'born', 'beginyear']:
-            column_mapping['birth_year'] = header
-        elif header_clean in ['death_year', 'deathyear', 'death', 'died', 'endyear']:
-            column_mapping['death_year'] = header
+        # The file is opened as utf-8-sig, so any BOM is already gone
+        column = HEADER_ALIASES.get(header.lower().strip())
+        if column:
+            column_mapping[column] = header
     
     print(f"Column mapping: {column_mapping}")
     return column_mapping
 
 def safe_int_convert(value):
     """Safely convert value to int, handling empty strings and None"""
-    if value is None or value == '' or str(value).strip() == '':
+    if value is None:
+        return None
+    # Stringify and strip once; CSV values are already str
+    text_value = (value if type(value) is str else str(value)).strip()
+    if not text_value:
         return None
     try:
-        return int(float(str(value).strip()))
-    except (ValueError, TypeError):
+        # Integer strings (nearly every ID and year) skip the float round trip
+        return int(text_value, 10)
+    except ValueError:
+        pass
+    try:
+        # Tolerate values such as "1930.0"
+        return int(float(text_value))
+    except (ValueError, OverflowError):
         return None
 
 def safe_str_convert(value):
@@ -89,24 +81,170 @@ def safe_str_convert(value):
         return None
     return str(value).strip() if str(value).strip() else None
 
+# Rows per INSERT statement; 10k short artist rows stay far below Redshift's 16 MB statement limit
+INSERT_BATCH_SIZE = 10000
+
+# Cleaned batches allowed to wait for the writer thread
+INSERT_QUEUE_DEPTH = 4
+
+ARTIST_COLUMNS = ('artist_id', 'full_name', 'nationality', 'gender', 'birth_year', 'death_year')
+
+# Built once; execute_values expands the template into each multi-row VALUES list
+INSERT_ARTISTS_SQL = f"INSERT INTO artists ({', '.join(ARTIST_COLUMNS)}) VALUES %s"
+INSERT_ARTISTS_TEMPLATE = f"({', '.join(['%s'] * len(ARTIST_COLUMNS))})"
+
+def get_column_positions(headers, column_mapping):
+    """Return the CSV position of each artist column (None when not mapped)"""
+    return tuple(
+        headers.index(column_mapping[column]) if column in column_mapping else None
+        for column in ARTIST_COLUMNS
+    )
+
+# Column limits from create_artists_table; Redshift VARCHAR widths count bytes
+INTEGER_MAX = 2**31 - 1
+SMALLINT_MAX = 2**15 - 1
+# Row position -> width for full_name, nationality and gender
+VARCHAR_BYTES = {1: 200, 2: 50, 3: 25}
+
+def artist_row_fits(cleaned):
+    """Whether every value of a cleaned row fits its Redshift column"""
+    if not -INTEGER_MAX - 1 <= cleaned[0] <= INTEGER_MAX:
+        return False
+    for year in (cleaned[4], cleaned[5]):
+        if year is not None and not -SMALLINT_MAX - 1 <= year <= SMALLINT_MAX:
+            return False
+    for index, width in VARCHAR_BYTES.items():
+        value = cleaned[index]
+        # Up to width // 4 characters always fit, whatever the encoding
+        if value is not None and len(value) > width // 4 and len(value.encode('utf-8')) > width:
+            return False
+    return True
+
+def clean_artist_row(row, positions):
+    """Return a cleaned (artist_id, full_name, nationality, gender, birth_year, death_year) tuple"""
+    id_pos, name_pos, nationality_pos, gender_pos, birth_pos, death_pos = positions
+    width = len(row)
+    return (
+        safe_int_convert(row[id_pos] if id_pos < width else None),
+        safe_str_convert(row[name_pos] if name_pos is not None and name_pos < width else None),
+        safe_str_convert(row[nationality_pos] if nationality_pos is not None and nationality_pos < width else None),
+        safe_str_convert(row[gender_pos] if gender_pos is not None and gender_pos < width else None),
+        safe_int_convert(row[birth_pos] if birth_pos is not None and birth_pos < width else None),
+        safe_int_convert(row[death_pos] if death_pos is not None and death_pos < width else None)
+    )
+
+# Seconds between progress lines while rows stream
+PROGRESS_INTERVAL = 2.0
+
+def iter_clean_rows(reader, positions, counts):
+    """Yield cleaned artist tuples from a CSV reader, counting loaded and skipped rows"""
+    last_log = time.monotonic()
+    for row_num, row in enumerate(reader, 1):
+        # Progress is gated on elapsed time so the loop does no per-row I/O
+        if not row_num % 1000 and time.monotonic() - last_log > PROGRESS_INTERVAL:
+            print(f"Processed {row_num} rows ({counts['loaded']} loaded, {counts['skipped']} skipped)...")
+            last_log = time.monotonic()
+        # Extract values by CSV position
+        cleaned = clean_artist_row(row, positions)
+        if cleaned[0] is None:
+            counts['skipped'] += 1
+            if row_num <= 5:  # Only show first few invalid IDs
+                print(f"Row {row_num}: Skipping row with invalid artist_id: '{row[positions[0]] if positions[0] < len(row) else ''}'")
+            continue
+        # A value the table cannot hold would abort the whole INSERT or COPY
+        if not artist_row_fits(cleaned):
+            counts['skipped'] += 1
+            if counts['skipped'] <= 5:  # Only show first few
+                print(f"Row {row_num}: Skipping row with values too large for the artists table: {cleaned}")
+            continue
+        counts['loaded'] += 1
+        yield cleaned
+
+# Files at least this large are parsed in parallel, in shards of about PARSE_SHARD_BYTES
+# by at most PARSE_MAX_WORKERS processes
+PARALLEL_PARSE_MIN_BYTES = 64 * 1024 * 1024
+PARSE_SHARD_BYTES = 4 * 1024 * 1024
+PARSE_MAX_WORKERS = 4
+
+# CSV records as csv.reader splits them: a quote opens a quoted field only at the
+# start of a field (so 5" tall is a plain value), and quoted fields may hold
+# delimiters and newlines
+_CSV_FIELD = rb'(?:"[^"]*(?:""[^"]*)*"[^,\r\n]*|[^,\r\n"][^,\r\n]*|)'
+_CSV_RECORD = rb'%s(?:,%s)*(?:\r\n|\n|\r)' % (_CSV_FIELD, _CSV_FIELD)
+CSV_RECORD = re.compile(_CSV_RECORD)
+CSV_RECORDS = re.compile(rb'(?:%s)*' % _CSV_RECORD)
+
+def find_shard_bounds(path, shard_bytes=PARSE_SHARD_BYTES):
+    """Split the data records of a CSV file into (start, end) byte ranges on record boundaries"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header = CSV_RECORD.match(data)
+        if not header or header.end() == len(data):
+            return []
+        bounds = [header.end()]
+        for target in range(bounds[0] + shard_bytes, len(data), shard_bytes):
+            # Only whole records before the target match, so the end is always a record boundary
+            end = CSV_RECORDS.match(data, bounds[-1], target).end()
+            if end > bounds[-1]:
+                bounds.append(end)
+        bounds.append(len(data))
+    return list(zip(bounds, bounds[1:]))
+
+def parse_shard(args):
+    """Read and clean the CSV records in one byte range; returns (rows, skipped)"""
+    path, start, end, positions = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+    cleaned = [clean_artist_row(row, positions) for row in csv.reader(io.StringIO(data, newline=None))]
+    rows = [row for row in cleaned if row[0] is not None and artist_row_fits(row)]
+    return rows, len(cleaned) - len(rows)
+
+def iter_parallel_clean_rows(path, positions, counts, shard_bytes=PARSE_SHARD_BYTES):
+    """Yield cleaned artist tuples, parsing shards of the file in worker processes"""
+    bounds = find_shard_bounds(path, shard_bytes)
+    print(f"Parsing {len(bounds)} shards in parallel...")
+    shards = ((path, start, end, positions) for start, end in bounds)
+    workers = min(os.cpu_count() or 1, PARSE_MAX_WORKERS)
+    # Spawned workers start clean instead of forking a process that may hold
+    # the loader's writer thread and open Redshift transaction
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        # Keep one shard per worker plus the one being consumed in flight, so
+        # parsed rows never pile up faster than the sink consumes them
+        pending = deque(executor.submit(parse_shard, shard) for shard in islice(shards, workers + 1))
+        try:
+            while pending:
+                rows, skipped = pending.popleft().result()
+                next_shard = next(shards, None)
+                if next_shard:
+                    pending.append(executor.submit(parse_shard, next_shard))
+                counts['loaded'] += len(rows)
+                counts['skipped'] += skipped
+                yield from rows
+        finally:
+            for future in pending:
+                future.cancel()
+
 def create_artists_table(engine):
     """Create artists table in Redshift"""
     try:
-        with engine.connect() as conn:
+        with engine.begin() as conn:
             # Drop table if exists
             conn.execute(text("DROP TABLE IF EXISTS artists"))
             
-            # Create table
+            # Create table; the small artist dimension is copied to every node
+            # (DISTSTYLE ALL) so joins on artist_id never redistribute rows
             conn.execute(text("""
                 CREATE TABLE artists (
-                    artist_id INTEGER NOT NULL,
-                    full_name VARCHAR(200),
-                    nationality VARCHAR(50),
-                    gender VARCHAR(25),
-                    birth_year INTEGER,
-                    death_year INTEGER,
+                    artist_id INTEGER NOT NULL ENCODE az64,
+                    full_name VARCHAR(200) ENCODE zstd,
+                    nationality VARCHAR(50) ENCODE zstd,
+                    gender VARCHAR(25) ENCODE zstd,
+                    birth_year SMALLINT ENCODE az64,
+                    death_year SMALLINT ENCODE az64,
                     CONSTRAINT artists_pk PRIMARY KEY (artist_id)
                 )
+                DISTSTYLE ALL
+                SORTKEY (artist_id)
             """))
         print("Created artists table")
         return True
@@ -114,75 +252,130 @@ def create_artists_table(engine):
         print(f"Error creating table: {str(e)}")
         return False
 
-def load_artist_data(engine, csv_path):
+def load_artist_data(engine, csv_path, batch_size=INSERT_BATCH_SIZE, use_copy=True):
     """Load artist data from CSV into Redshift"""
-    column_mapping = inspect_csv_structure(csv_path)
-    if not column_mapping:
-        return False
-    
-    # Check if we have the essential columns
-    if 'artist_id' not in column_mapping:
-        print("Error: No artist_id column found in CSV")
-        print("Available mappings:", column_mapping)
+    if not os.path.exists(csv_path):
+        print(f"Error: CSV file not found at {csv_path}")
         return False
     
-    success_count = 0
-    error_count = 0
-    
+    # Header detection and loading share one pass over the file
+    with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig handles BOM
+        reader = csv.reader(f)
+        headers = next(reader, None)
+        if not headers:
+            print("CSV file appears to be empty")
+            return False
+        
+        print(f"CSV headers found: {headers}")
+        column_mapping = detect_column_mapping(headers)
+        
+        # Check if we have the essential columns
+        if 'artist_id' not in column_mapping:
+            print("Error: No artist_id column found in CSV")
+            print("Available mappings:", column_mapping)
+            return False
+        
+        counts = Counter()
+        positions = get_column_positions(headers, column_mapping)
+        if os.path.getsize(csv_path) >= PARALLEL_PARSE_MIN_BYTES:
+            rows = iter_parallel_clean_rows(csv_path, positions, counts)
+        else:
+            rows = iter_clean_rows(reader, positions, counts)
+        
+        # Bulk load through S3 when a staging bucket and IAM role are configured
+        if use_copy and REDSHIFT_CONFIG.s3_bucket and REDSHIFT_CONFIG.iam_role:
+            return copy_artist_data_from_s3(engine, rows, counts, REDSHIFT_CONFIG.s3_bucket, REDSHIFT_CONFIG.iam_role)
+        return insert_artist_data(engine, rows, counts, batch_size)
+
+def iter_batches(rows, size):
+    """Group rows into lists of at most size rows"""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def insert_artist_data(engine, rows, counts, batch_size=INSERT_BATCH_SIZE):
+    """Insert cleaned rows with multi-row INSERT statements"""
     try:
-        with engine.connect() as conn:
-            with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig handles BOM
-                reader = csv.DictReader(f)
-                
-                for row_num, row in enumerate(reader, 1):
+        # The main thread parses and cleans the CSV while a writer thread sends
+        # finished batches, all in one transaction
+        print("Inserting artists...")
+        with engine.begin() as conn:
+            cursor = conn.connection.cursor()
+            batches = queue.Queue(maxsize=INSERT_QUEUE_DEPTH)
+            errors = []
+
+            def writer():
+                # Keep draining after a failure so the parser never blocks on put()
+                while (batch := batches.get()) is not None:
+                    if errors:
+                        continue
                     try:
-                        # Extract values using our column mapping
-                        artist_id = safe_int_convert(row.get(column_mapping['artist_id']))
-                        if artist_id is None:
-                            if row_num <= 5:  # Only show first few invalid IDs
-                                print(f"Row {row_num}: Skipping row with invalid artist_id: '{row.get(column_mapping['artist_id'])}'")
-                            continue
-                        
-                        full_name = safe_str_convert(row.get(column_mapping.get('full_name')))
-                        nationality = safe_str_convert(row.get(column_mapping.get('nationality')))
-                        gender = safe_str_convert(row.get(column_mapping.get('gender')))
-                        birth_year = safe_int_convert(row.get(column_mapping.get('birth_year')))
-                        death_year = safe_int_convert(row.get(column_mapping.get('death_year')))
-                        
-                        # Insert into database
-                        conn.execute(text("""
-                            INSERT INTO artists (artist_id, full_name, nationality, gender, birth_year, death_year)
-                            VALUES (:artist_id, :full_name, :nationality, :gender, :birth_year, :death_year)
-                        """), {
-                            'artist_id': artist_id,
-                            'full_name': full_name,
-                            'nationality': nationality,
-                            'gender': gender,
-                            'birth_year': birth_year,
-                            'death_year': death_year
-                        })
-                        
-                        success_count += 1
-                        if success_count % 500 == 0:
-                            print(f"Loaded {success_count} artists...")
-                            
+                        execute_values(
+                            cursor,
+                            INSERT_ARTISTS_SQL,
+                            batch,
+                            template=INSERT_ARTISTS_TEMPLATE,
+                            page_size=batch_size
+                        )
                     except Exception as e:
-                        error_count += 1
-                        if error_count <= 5:  # Only show first few errors
-                            artist_id_str = row.get(column_mapping.get('artist_id', ''), 'unknown')
-                            print(f"Row {row_num}: Error loading artist {artist_id_str}: {str(e)}")
-                        if error_count > 100:  # Stop if too many errors
-                            print("Too many errors, stopping...")
-                            break
-                        continue
+                        errors.append(e)
+
+            thread = threading.Thread(target=writer, daemon=True)
+            thread.start()
+            try:
+                for batch in iter_batches(rows, batch_size):
+                    if errors:
+                        break
+                    batches.put(batch)
+            finally:
+                batches.put(None)
+                thread.join()
+            if errors:
+                raise errors[0]
         
-        print(f"Data loading completed. Success: {success_count}, Errors: {error_count}")
-        return success_count > 0
+        print(f"Data loading completed. Success: {counts['loaded']}, Skipped: {counts['skipped']}")
+        return counts['loaded'] > 0
         
     except Exception as e:
         print(f"Loading failed: {str(e)}")
         return False
 
+def upload_clean_csv_to_s3(rows, bucket, key):
+    """Write rows as a gzipped CSV and upload it to s3://bucket/key"""
+    # Held in memory up to 64 MB, then spilled to a temporary file
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spool:
+        with gzip.GzipFile(fileobj=spool, mode='wb') as gz, io.TextIOWrapper(gz, encoding='utf-8', newline='') as out:
+            # None is written as an empty field, which EMPTYASNULL loads as NULL
+            csv.writer(out).writerows(rows)
+        spool.seek(0)
+        boto3.client('s3').upload_fileobj(spool, bucket, key)
+
+def copy_artist_data_from_s3(engine, rows, counts, bucket, role_arn):
+    """Stage cleaned rows in S3 and load them with a single COPY"""
+    key = f"{REDSHIFT_CONFIG.s3_prefix}artists.csv.gz"
+
+    try:
+        upload_clean_csv_to_s3(rows, bucket, key)
+        print(f"Uploaded {counts['loaded']} cleaned rows to s3://{bucket}/{key}")
+
+        with engine.begin() as conn:
+            # Bound parameters are quoted by the driver, so bucket/role values cannot break the statement
+            conn.execute(text("""
+                COPY artists (artist_id, full_name, nationality, gender, birth_year, death_year)
+                FROM :source
+                IAM_ROLE :iam_role
+                FORMAT AS CSV
+                GZIP
+                EMPTYASNULL
+            """), {'source': f"s3://{bucket}/{key}", 'iam_role': role_arn})
+
+        print(f"Data loading completed. Success: {counts['loaded']}, Skipped: {counts['skipped']}")
+        return counts['loaded'] > 0
+
+    except Exception as e:
+        print(f"COPY from S3 failed: {str(e)}")
+        return False
+
 def verify_data_load(engine):
     """Verify the data was loaded correctly"""
     with engine.connect() as conn:
@@ -204,22 +397,33 @@ def verify_data_load(engine):
             print(f"Error verifying data: {str(e)}")
             return False
 
-if __name__ == '__main__':
+def load(csv_path, *, batch_size=INSERT_BATCH_SIZE, use_copy=True):
+    """Recreate the artists table and load csv_path into it; returns True on success"""
+    engine = get_engine()
+    return create_artists_table(engine) and load_artist_data(engine, csv_path, batch_size, use_copy)
+
+def main(csv_path='SampleData/moma_public_artists.csv'):
+    """Create the artists table, load the CSV and verify it; returns the exit code"""
     print("Connecting to Redshift...")
-    engine = get_redshift_connection()
+    engine = get_engine()
     
     if not check_redshift_connection(engine):
         print("Failed to connect to Redshift")
-        exit(1)
+        return 1
 
     print("Creating artists table...")
-    if create_artists_table(engine):
-        print("Loading artist data...")
-        csv_path = 'SampleData/moma_public_artists.csv'
-        if load_artist_data(engine, csv_path):
-            print("Successfully loaded MoMA artist data into Redshift")
-            verify_data_load(engine)
-        else:
-            print("Failed to load artist data")
-    else:
-        print("Failed to create artists table")
\ No newline at end of file
+    if not create_artists_table(engine):
+        print("Failed to create artists table")
+        return 1
+
+    print("Loading artist data...")
+    if not load_artist_data(engine, csv_path):
+        print("Failed to load artist data")
+        return 1
+
+    print("Successfully loaded MoMA artist data into Redshift")
+    verify_data_load(engine)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import functools
+from dataclasses import dataclass, field
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+# Loading environment variables
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class RedshiftConfig:
+    """Redshift connection and load settings, read from the environment once"""
+    host: str
+    port: str
+    database: str
+    username: str
+    password: str = field(repr=False)
+    s3_bucket: str = None
+    s3_prefix: str = 'staging/'
+    iam_role: str = None
+
+    @classmethod
+    def from_env(cls):
+        """Build the config from REDSHIFT_* environment variables"""
+        port = os.getenv('REDSHIFT_PORT')
+        if not port or port.lower() == 'none':
+            port = '5439'
+        return cls(
+            host=os.getenv('REDSHIFT_HOST'),
+            port=port,
+            database=os.getenv('REDSHIFT_DB'),
+            username=os.getenv('REDSHIFT_USER'),
+            password=os.getenv('REDSHIFT_PASSWORD'),
+            s3_bucket=os.getenv('REDSHIFT_S3_BUCKET'),
+            s3_prefix=os.getenv('REDSHIFT_S3_PREFIX', 'staging/'),
+            iam_role=os.getenv('REDSHIFT_IAM_ROLE')
+        )
+
+    def validate(self):
+        """Raise ValueError when a required connection setting is missing"""
+        if not all([self.host, self.database, self.username, self.password]):
+            raise ValueError("Missing required Redshift environment variables")
+
+    @property
+    def uri(self):
+        """SQLAlchemy connection URI"""
+        return f"redshift+psycopg2://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
+
+
+REDSHIFT_CONFIG = RedshiftConfig.from_env()
+
+
+@functools.lru_cache(maxsize=1)
+def get_engine():
+    """Return the shared, pooled Redshift engine (built once and reused)"""
+    REDSHIFT_CONFIG.validate()
+    return create_engine(
+        REDSHIFT_CONFIG.uri,
+        pool_size=10,
+        max_overflow=5,
+        pool_pre_ping=True,
+        # Replace connections before idle-timeout policies can drop them
+        pool_recycle=1800
+    )
@@ -0,0 +1,83 @@
+import time
+import threading
+import numpy as np
+
+
+def normalize_question(question):
+    """Collapse case and whitespace so trivially different questions share a key"""
+    return " ".join(question.lower().split())
+
+
+class SemanticCache:
+    """Cache values keyed on question embeddings.
+
+    Lookups first try an exact match on the normalized question, then fall
+    back to a cosine-similarity search over the embeddings of previously
+    answered questions. With ``embed_fn=None`` only exact matches are used
+    and no embedding is ever computed. Entries expire after ``ttl_seconds``.
+    """
+
+    def __init__(self, embed_fn, threshold=0.85, ttl_seconds=3600, max_entries=1024):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._vectors = None
+        self._entries = []
+
+    def _expire(self, now):
+        """Drop expired entries (caller holds the lock)"""
+        self._exact = {k: v for k, v in self._exact.items() if now - v[1] < self.ttl_seconds}
+        keep = [i for i, entry in enumerate(self._entries) if now - entry[2] < self.ttl_seconds]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep else None
+
+    def lookup(self, question):
+        """Return (value, embedding); value is None on a miss.
+
+        The embedding is returned so the caller can pass it back to ``add``
+        without embedding the question a second time.
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._exact:
+                return self._exact[key][0], None
+
+        if self.embed_fn is None:
+            return None, None
+        try:
+            vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        except Exception as e:
+            print(f"Semantic cache embedding error: {e}")
+            return None, None
+
+        with self._lock:
+            if self._vectors is None:
+                return None, vector
+            scores = self._vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return self._entries[best][1], vector
+        return None, vector
+
+    def add(self, question, vector, value):
+        """Store value for question (and its embedding, when available)"""
+        now = time.time()
+        with self._lock:
+            if len(self._exact) >= self.max_entries:
+                self._exact.pop(next(iter(self._exact)))
+            self._exact[normalize_question(question)] = (value, now)
+            if vector is None:
+                return
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(0)
+                self._vectors = self._vectors[1:]
+            self._entries.append((question, value, now))
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
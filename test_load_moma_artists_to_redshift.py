@@ -0,0 +1,51 @@
+import csv
+from collections import Counter
+from load_moma_artists_to_redshift import (
+    find_shard_bounds,
+    get_column_positions,
+    detect_column_mapping,
+    iter_clean_rows,
+    iter_parallel_clean_rows,
+    parse_shard,
+)
+
+# Literal quotes in unquoted fields, quoted delimiters/newlines and escaped quotes
+SAMPLE_CSV = (
+    'ConstituentID,DisplayName,Nationality,Gender,BeginDate,EndDate\n'
+    '1,Robert Arneson,American,Male,1930,1992\n'
+    '2,5" tall,American,,1950,0\n'
+    '3,"Doroteo\nArnaiz",Spanish,Male,1936,0\n'
+    '4,Ann "Jr" Lee,,Female,1944,\n'
+    '5,"Smith, ""The Elder""",British,Male,1900,1980\n'
+    '6,12" x 9",,,,\n'
+    '7,"Multi\nLine\nName",Dutch,Non-Binary,1960,\n'
+) * 50
+
+def write_sample(tmp_path):
+    path = tmp_path / 'artists.csv'
+    path.write_bytes(SAMPLE_CSV.encode('utf-8'))
+    return path
+
+def sequential_rows(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        positions = get_column_positions(headers, detect_column_mapping(headers))
+        return positions, list(iter_clean_rows(reader, positions, Counter()))
+
+# Every shard size must split on record boundaries and reproduce the sequential parse
+def test_shards_match_sequential_parse(tmp_path):
+    path = write_sample(tmp_path)
+    positions, expected = sequential_rows(path)
+    for shard_bytes in range(1, 200):
+        rows = []
+        for start, end in find_shard_bounds(path, shard_bytes):
+            rows.extend(parse_shard((path, start, end, positions))[0])
+        assert rows == expected, f"shard_bytes={shard_bytes}"
+
+def test_parallel_parse_matches_sequential_parse(tmp_path):
+    path = write_sample(tmp_path)
+    positions, expected = sequential_rows(path)
+    counts = Counter()
+    assert list(iter_parallel_clean_rows(path, positions, counts, shard_bytes=512)) == expected
+    assert counts['loaded'] == len(expected)